@@ -1,12 +1,20 @@
 import streamlit as st
 import openai
-import requests
-import json
+import httpx
+import orjson
+import json_repair
+import re
+import textwrap
 import time
+import asyncio
+import threading
+from collections import defaultdict, deque
 from datetime import datetime
-import pandas as pd
+import numpy as np
 import os
 
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+
 # Page configuration
 st.set_page_config(
     page_title="EduSearch Pro - Student Learning Hub",
@@ -16,7 +24,7 @@ st.set_page_config(
 )
 
 # Custom CSS for better styling
-st.markdown("""
+CUSTOM_CSS = """
 <style>
     .main-header {
         font-size: 3rem;
@@ -69,7 +77,40 @@ st.markdown("""
         margin: 1rem 0;
     }
 </style>
-""", unsafe_allow_html=True)
+"""
+
+# cache_data (not cache_resource) so the recorded st.markdown element is
+# replayed on reruns without re-diffing the raw CSS string
+@st.cache_data
+def inject_css():
+    st.markdown(CUSTOM_CSS, unsafe_allow_html=True)
+
+# Subject choices shared by the explorer and quiz pages; a module-level
+# tuple keeps the dropdown order stable across reruns
+SUBJECTS = ("", "Mathematics", "Physics", "Chemistry", "Biology", "History",
+            "Literature", "Computer Science", "Economics", "Psychology")
+
+# Persistent search history store. st.connection pools the SQLAlchemy
+# engine; the cache_resource wrapper makes sure the DDL runs only once.
+@st.cache_resource
+def get_history_connection():
+    from sqlalchemy import text
+
+    conn = st.connection("history", type="sql", url="sqlite:///history.db")
+    with conn.session as s:
+        s.execute(text(
+            "CREATE TABLE IF NOT EXISTS history (topic TEXT, subject TEXT, timestamp TEXT)"
+        ))
+        s.commit()
+    return conn
+
+def load_recent_history(limit=10):
+    conn = get_history_connection()
+    df = conn.query(
+        "SELECT topic, subject, timestamp FROM history ORDER BY rowid DESC LIMIT :limit",
+        params={"limit": limit}, ttl=0,
+    )
+    return list(reversed(df.to_dict("records")))
 
 # Initialize session state
 def initialize_session_state():
@@ -83,112 +124,313 @@ def initialize_session_state():
         st.session_state.quiz_completed = False
     if 'topic_content' not in st.session_state:
         st.session_state.topic_content = ""
+    if 'explored_topic' not in st.session_state:
+        st.session_state.explored_topic = ""
+    if 'explored_subject' not in st.session_state:
+        st.session_state.explored_subject = ""
     if 'search_history' not in st.session_state:
-        st.session_state.search_history = []
+        # Seed from the persistent store so history survives reloads
+        st.session_state.search_history = deque(load_recent_history(), maxlen=10)
+    if 'quiz_bank' not in st.session_state:
+        st.session_state.quiz_bank = {}
+    if 'history_index' not in st.session_state:
+        rebuild_history_index()
 
-# OpenAI API setup
-def setup_openai():
+# OpenAI API setup: the secrets lookup and client construction run once and
+# the resulting client (with its pooled HTTP/2 transport) is shared across
+# sessions; reruns skip the per-run secrets file access entirely
+@st.cache_resource
+def get_openai_client():
     api_key = st.secrets.get("OPENAI_API_KEY") or os.getenv("OPENAI_API_KEY")
     if not api_key:
         st.error("⚠️ OpenAI API key not found. Please add it to Streamlit secrets or environment variables.")
         st.stop()
-    openai.api_key = api_key
+    return openai.OpenAI(
+        api_key=api_key,
+        http_client=httpx.Client(
+            http2=True,
+            limits=httpx.Limits(max_keepalive_connections=8),
+        ),
+    )
 
-# Function to search for topic information
-def search_topic_info(topic, subject=None):
-    try:
-        prompt = f"""
-        Provide comprehensive educational content about "{topic}" {f"in {subject}" if subject else ""}.
-        
-        Structure your response as follows:
-        
-        ## Overview
-        Provide a clear, concise introduction to the topic.
-        
-        ## Key Concepts
-        List and explain the main concepts, theories, or principles.
-        
-        ## Important Details
-        Provide detailed explanations, formulas, examples, or case studies.
-        
-        ## Real-world Applications
-        Explain how this topic is applied in real life or industry.
-        
-        ## Study Tips
-        Provide specific tips for understanding and remembering this topic.
-        
-        Keep the content educational, accurate, and suitable for students.
-        """
-        
-        response = openai.ChatCompletion.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": "You are an expert educational tutor helping students learn various subjects."},
-                {"role": "user", "content": prompt}
-            ],
-            max_tokens=1500,
-            temperature=0.7
+# Open the keep-alive connection in the background at session start so the
+# user's first real request skips the TLS + DNS handshake
+def warm_openai_connection():
+    if 'connection_warmed' in st.session_state:
+        return
+    st.session_state.connection_warmed = True
+    client = get_openai_client()
+
+    def ping():
+        try:
+            client.chat.completions.create(
+                model="gpt-3.5-turbo",
+                messages=[{"role": "user", "content": "."}],
+                max_tokens=1,
+            )
+        except Exception:
+            pass  # best-effort warm-up; real requests surface their own errors
+
+    threading.Thread(target=ping, daemon=True).start()
+
+# Token-bucket rate limiter so bursts queue locally instead of burning
+# round trips on 429 responses
+class RateLimiter:
+    def __init__(self, max_rpm=60, max_tpm=90000):
+        self.max_rpm = max_rpm
+        self.max_tpm = max_tpm
+        self._lock = threading.Lock()
+        self._requests = deque()  # request timestamps within the last minute
+        self._tokens = deque()    # (timestamp, token estimate) within the last minute
+
+    def acquire(self, estimated_tokens=0):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                while self._requests and now - self._requests[0] > 60:
+                    self._requests.popleft()
+                while self._tokens and now - self._tokens[0][0] > 60:
+                    self._tokens.popleft()
+
+                tokens_in_window = sum(t for _, t in self._tokens)
+                if (len(self._requests) < self.max_rpm
+                        and tokens_in_window + estimated_tokens <= self.max_tpm):
+                    self._requests.append(now)
+                    self._tokens.append((now, estimated_tokens))
+                    return
+            time.sleep(1)
+
+@st.cache_resource
+def get_rate_limiter():
+    return RateLimiter(
+        max_rpm=int(st.secrets.get("OPENAI_MAX_RPM", 60)),
+        max_tpm=int(st.secrets.get("OPENAI_MAX_TPM", 90000)),
+    )
+
+# Throttled ChatCompletion wrapper with exponential backoff on rate limits
+def throttled_chat_completion(messages, max_tokens, **kwargs):
+    # Streaming responses carry no usage info, so budget conservatively:
+    # rough prompt estimate (~4 chars/token) plus the full generation budget
+    estimated_tokens = sum(len(m["content"]) for m in messages) // 4 + max_tokens
+
+    client = get_openai_client()
+    for attempt in range(3):
+        get_rate_limiter().acquire(estimated_tokens)
+        try:
+            return client.chat.completions.create(
+                messages=messages, max_tokens=max_tokens, **kwargs
+            )
+        except openai.RateLimitError:
+            if attempt == 2:
+                raise
+            time.sleep(2 ** attempt)
+
+# Function to search for topic information. Exceptions propagate to the
+# caller: cache_data does not cache them, so a transient failure stays
+# retryable instead of being pinned for the full TTL. The underscore
+# prefix keeps the streaming callback out of the cache key.
+@st.cache_data(ttl=86400, max_entries=256, show_spinner=False)
+def search_topic_info(topic, subject=None, _on_delta=None):
+    # Dedented so the prompt doesn't spend input tokens on indentation
+    prompt = textwrap.dedent(f"""\
+    Provide comprehensive educational content about "{topic}" {f"in {subject}" if subject else ""}.
+
+    Structure your response as follows:
+
+    ## Overview
+    Provide a clear, concise introduction to the topic.
+
+    ## Key Concepts
+    List and explain the main concepts, theories, or principles.
+
+    ## Important Details
+    Provide detailed explanations, formulas, examples, or case studies.
+
+    ## Real-world Applications
+    Explain how this topic is applied in real life or industry.
+
+    ## Study Tips
+    Provide specific tips for understanding and remembering this topic.
+
+    Keep the content educational, accurate, and suitable for students.
+    """)
+
+    response = throttled_chat_completion(
+        model="gpt-3.5-turbo",
+        messages=[
+            {"role": "system", "content": "You are an expert educational tutor helping students learn various subjects."},
+            {"role": "user", "content": prompt}
+        ],
+        max_tokens=900,
+        temperature=0.7,
+        stream=True
+    )
+
+    # Report tokens to the caller as they arrive so it can render progress
+    content = ""
+    for chunk in response:
+        delta = chunk.choices[0].delta.content or ""
+        if delta:
+            content += delta
+            if _on_delta:
+                _on_delta(content)
+
+    return content
+
+# Invariant quiz instructions live in the system message so OpenAI's prompt
+# cache can reuse the prefix across calls; only the user message varies
+QUIZ_SYSTEM_PROMPT = textwrap.dedent("""\
+    You are an expert quiz generator creating educational assessments.
+    Create multiple-choice questions for the topic, subject, difficulty
+    levels, and question count supplied by the user.
+
+    Format each question as a JSON object with this structure:
+    {
+        "question": "The question text",
+        "options": ["A) Option 1", "B) Option 2", "C) Option 3", "D) Option 4"],
+        "correct_answer": "A",
+        "explanation": "Brief explanation of why this is correct"
+    }
+
+    Return ONLY a JSON object mapping each difficulty level to its array of
+    question objects, e.g. {"easy": [...], "medium": [...], "hard": [...]}.
+    No additional text. Make sure questions test understanding, not just
+    memorization.
+""")
+
+# Function to generate quiz questions for all difficulty levels in one request
+@st.cache_data(ttl=86400, max_entries=256, show_spinner=False)
+def generate_quiz(topic, subject=None, difficulty="medium", num_questions=5,
+                  difficulties=("easy", "medium", "hard")):
+    # Serve from the session quiz bank when this topic was already generated
+    bank_key = (topic, subject or "", num_questions)
+    cached = st.session_state.quiz_bank.get(bank_key)
+    if cached and cached.get(difficulty):
+        return cached[difficulty]
+
+    prompt = (
+        f"Topic: {topic}; Subject: {subject or 'general'}; "
+        f"Difficulties: {', '.join(difficulties)}; "
+        f"Questions per difficulty: {num_questions}"
+    )
+
+    # Budget ~200 tokens per question (text, four options, explanation),
+    # capped at the model's output limit
+    max_tokens = min(200 * num_questions * len(difficulties), 4096)
+
+    response = throttled_chat_completion(
+        model="gpt-3.5-turbo",
+        messages=[
+            {"role": "system", "content": QUIZ_SYSTEM_PROMPT},
+            {"role": "user", "content": prompt}
+        ],
+        max_tokens=max_tokens,
+        temperature=0.8,
+        stream=True,
+        response_format={"type": "json_object"}
+    )
+
+    # Accumulate the streamed JSON and parse once the stream closes
+    quiz_text = ""
+    finish_reason = None
+    for chunk in response:
+        choice = chunk.choices[0]
+        quiz_text += choice.delta.content or ""
+        if choice.finish_reason:
+            finish_reason = choice.finish_reason
+
+    # A truncated bank would repair into a dict with missing or partial
+    # difficulty lists; fail loudly instead so the result is never cached
+    if finish_reason == "length":
+        raise ValueError(
+            "Quiz generation hit the token limit before finishing; "
+            "try fewer questions."
         )
-        
-        return response.choices[0].message.content
-    except Exception as e:
-        st.error(f"Error fetching topic information: {str(e)}")
-        return None
 
-# Function to generate quiz questions
-def generate_quiz(topic, subject=None, difficulty="medium", num_questions=5):
+    # The model occasionally wraps the payload in prose or code fences;
+    # slice out the JSON object and repair locally rather than paying
+    # for another API round trip
+    match = re.search(r"\{.*\}", quiz_text, re.DOTALL)
+    if match:
+        quiz_text = match.group(0)
     try:
-        prompt = f"""
-        Create {num_questions} multiple-choice questions about "{topic}" {f"in {subject}" if subject else ""} 
-        at {difficulty} difficulty level.
-        
-        Format each question as a JSON object with this structure:
-        {{
-            "question": "The question text",
-            "options": ["A) Option 1", "B) Option 2", "C) Option 3", "D) Option 4"],
-            "correct_answer": "A",
-            "explanation": "Brief explanation of why this is correct"
-        }}
-        
-        Return ONLY a JSON array of {num_questions} question objects. No additional text.
-        Make sure questions test understanding, not just memorization.
-        """
-        
-        response = openai.ChatCompletion.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": "You are an expert quiz generator creating educational assessments."},
-                {"role": "user", "content": prompt}
-            ],
-            max_tokens=1000,
-            temperature=0.8
-        )
-        
-        quiz_text = response.choices[0].message.content.strip()
-        quiz_questions = json.loads(quiz_text)
-        return quiz_questions
-    except Exception as e:
-        st.error(f"Error generating quiz: {str(e)}")
-        return None
+        quiz_by_difficulty = orjson.loads(quiz_text)
+    except orjson.JSONDecodeError:
+        quiz_by_difficulty = json_repair.loads(quiz_text)
+    st.session_state.quiz_bank[bank_key] = quiz_by_difficulty
+    return quiz_by_difficulty.get(difficulty)
+
+# Fetch topic content and pre-warm the quiz bank concurrently, so the quiz
+# is already generated by the time the user clicks "Generate Quiz"
+async def fetch_topic_and_quiz(topic, subject=None):
+    ctx = get_script_run_ctx()
+
+    def run_with_ctx(fn, *args, **kwargs):
+        add_script_run_ctx(threading.current_thread(), ctx)
+        return fn(*args, **kwargs)
+
+    # Stream tokens into a placeholder so the user sees content as it arrives
+    placeholder = st.empty()
+
+    def on_delta(text):
+        placeholder.markdown(text + "▌")
+
+    content, quiz = await asyncio.gather(
+        asyncio.to_thread(run_with_ctx, search_topic_info, topic, subject,
+                          _on_delta=on_delta),
+        asyncio.to_thread(run_with_ctx, generate_quiz, topic, subject),
+        return_exceptions=True,
+    )
+    placeholder.empty()
+
+    if isinstance(content, Exception):
+        st.error(f"Error fetching topic information: {str(content)}")
+        content = None
+    # The quiz pre-warm is best effort: if it failed, the Quiz Generator
+    # page retries and reports its own error
+    return content
+
+# Rebuild the lookup index used by the study history filters. The history
+# holds at most 10 entries, so a full rebuild per save is trivial and stays
+# correct when the deque evicts old entries.
+def rebuild_history_index():
+    history = st.session_state.get('search_history', ())
+    by_subject = defaultdict(list)
+    for i, entry in enumerate(history):
+        by_subject[entry['subject']].append(i)
+    st.session_state.history_index = {
+        'lower_topics': [entry['topic'].lower() for entry in history],
+        'by_subject': by_subject,
+    }
 
 # Function to save search history
 def save_search_history(topic, subject, timestamp):
+    from sqlalchemy import text
+
     search_entry = {
         "topic": topic,
         "subject": subject or "General",
         "timestamp": timestamp
     }
+    # The deque's maxlen keeps only the last 10 searches
     st.session_state.search_history.append(search_entry)
-    
-    # Keep only last 10 searches
-    if len(st.session_state.search_history) > 10:
-        st.session_state.search_history = st.session_state.search_history[-10:]
+    rebuild_history_index()
+
+    conn = get_history_connection()
+    with conn.session as s:
+        s.execute(text(
+            "INSERT INTO history (topic, subject, timestamp) "
+            "VALUES (:topic, :subject, :timestamp)"
+        ), search_entry)
+        s.commit()
 
 # Main application
 def main():
     initialize_session_state()
-    setup_openai()
-    
+    get_openai_client()
+    warm_openai_connection()
+    inject_css()
+
     # Header
     st.markdown('<h1 class="main-header">🎓 EduSearch Pro</h1>', unsafe_allow_html=True)
     st.markdown("### Your AI-Powered Learning Companion")
@@ -231,54 +473,78 @@ def topic_explorer_page():
         topic = st.text_input("🎯 Enter the topic you want to learn about:", placeholder="e.g., Photosynthesis, Calculus, World War II")
     
     with col2:
-        subject = st.selectbox("📚 Subject (Optional):", 
-                              ["", "Mathematics", "Physics", "Chemistry", "Biology", "History", 
-                               "Literature", "Computer Science", "Economics", "Psychology"])
+        subject = st.selectbox("📚 Subject (Optional):", SUBJECTS)
     
     if st.button("🔍 Search Topic", type="primary"):
         if topic.strip():
             with st.spinner("🔄 Searching for comprehensive information..."):
-                content = search_topic_info(topic, subject)
-                
+                content = asyncio.run(fetch_topic_and_quiz(topic, subject))
+
                 if content:
                     st.session_state.topic_content = content
+                    st.session_state.explored_topic = topic
+                    st.session_state.explored_subject = subject
                     save_search_history(topic, subject, datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
-                    
-                    st.success(f"✅ Found comprehensive information about: **{topic}**")
-                    
-                    # Display content in an organized way
-                    st.markdown("---")
-                    st.markdown(content)
-                    
-                    # Quick action buttons
-                    st.markdown("---")
-                    col1, col2, col3 = st.columns(3)
-                    
-                    with col1:
-                        if st.button("📝 Generate Quiz"):
-                            st.session_state.current_topic = topic
-                            st.session_state.current_subject = subject
-                            st.rerun()
-                    
-                    with col2:
-                        if st.button("📋 Copy Content"):
-                            st.code(content)
-                    
-                    with col3:
-                        if st.button("💾 Save Notes"):
-                            st.download_button(
-                                label="Download as Text",
-                                data=content,
-                                file_name=f"{topic.replace(' ', '_')}_notes.txt",
-                                mime="text/plain"
-                            )
         else:
             st.warning("⚠️ Please enter a topic to search!")
 
+    if st.session_state.topic_content:
+        show_topic_result(st.session_state.topic_content,
+                          st.session_state.explored_topic,
+                          st.session_state.explored_subject)
+
+# Fragment so the action buttons below the content don't force the large
+# markdown block through a full page rerun
+@st.fragment
+def show_topic_result(content, topic, subject):
+    st.success(f"✅ Found comprehensive information about: **{topic}**")
+
+    # Display content in an organized way
+    st.markdown("---")
+    st.markdown(content)
+
+    # Quick action buttons
+    st.markdown("---")
+    col1, col2, col3 = st.columns(3)
+
+    with col1:
+        if st.button("📝 Generate Quiz"):
+            st.session_state.current_topic = topic
+            st.session_state.current_subject = subject
+            # Page-level state changed, so this needs a full rerun
+            st.rerun()
+
+    with col2:
+        if st.button("📋 Copy Content"):
+            st.code(content)
+
+    with col3:
+        if st.button("💾 Save Notes"):
+            st.download_button(
+                label="Download as Text",
+                data=content,
+                file_name=f"{topic.replace(' ', '_')}_notes.txt",
+                mime="text/plain"
+            )
+
 def quiz_generator_page():
     st.header("📝 Quiz Generator")
     st.markdown("Test your knowledge with AI-generated quizzes!")
-    
+
+    if hasattr(st.session_state, 'current_topic') and not st.session_state.quiz_questions:
+        # Quiz was pre-warmed while the topic was being explored, so this
+        # is served from the quiz bank without a network call
+        try:
+            questions = generate_quiz(st.session_state.current_topic, st.session_state.current_subject)
+        except Exception as e:
+            st.error(f"Error generating quiz: {str(e)}")
+            questions = None
+        if questions:
+            st.session_state.quiz_questions = questions
+            st.session_state.current_question = 0
+            st.session_state.user_answers = []
+            st.session_state.quiz_completed = False
+
     if not hasattr(st.session_state, 'current_topic'):
         col1, col2 = st.columns([2, 1])
         
@@ -286,9 +552,7 @@ def quiz_generator_page():
             topic = st.text_input("🎯 Enter topic for quiz:", placeholder="e.g., Photosynthesis, Algebra, Shakespeare")
         
         with col2:
-            subject = st.selectbox("📚 Subject:", 
-                                  ["", "Mathematics", "Physics", "Chemistry", "Biology", "History", 
-                                   "Literature", "Computer Science", "Economics", "Psychology"])
+            subject = st.selectbox("📚 Subject:", SUBJECTS)
         
         col1, col2, col3 = st.columns(3)
         
@@ -303,8 +567,12 @@ def quiz_generator_page():
             if st.button("🎯 Generate Quiz", type="primary"):
                 if topic.strip():
                     with st.spinner("🔄 Generating your personalized quiz..."):
-                        questions = generate_quiz(topic, subject, difficulty, num_questions)
-                        
+                        try:
+                            questions = generate_quiz(topic, subject, difficulty, num_questions)
+                        except Exception as e:
+                            st.error(f"Error generating quiz: {str(e)}")
+                            questions = None
+
                         if questions:
                             st.session_state.quiz_questions = questions
                             st.session_state.current_question = 0
@@ -321,6 +589,9 @@ def quiz_generator_page():
     elif st.session_state.quiz_completed:
         display_quiz_results()
 
+# Fragment so Next/Previous only re-run the question display, not the
+# whole page (sidebar, CSS injection, session init)
+@st.fragment
 def display_quiz():
     questions = st.session_state.quiz_questions
     current_q = st.session_state.current_question
@@ -350,7 +621,7 @@ def display_quiz():
             if current_q > 0:
                 if st.button("⬅️ Previous"):
                     st.session_state.current_question -= 1
-                    st.rerun()
+                    st.rerun(scope="fragment")
         
         with col2:
             if st.button("➡️ Next" if current_q < len(questions) - 1 else "🏁 Finish Quiz"):
@@ -362,18 +633,23 @@ def display_quiz():
                 
                 if current_q < len(questions) - 1:
                     st.session_state.current_question += 1
+                    st.rerun(scope="fragment")
                 else:
+                    # Finishing hands control back to the page to show results,
+                    # which needs a full rerun
                     st.session_state.quiz_completed = True
-                
-                st.rerun()
+                    st.rerun()
 
 def display_quiz_results():
     questions = st.session_state.quiz_questions
     user_answers = st.session_state.user_answers
     
-    # Calculate score
-    correct_count = sum(1 for i, q in enumerate(questions) 
-                       if i < len(user_answers) and user_answers[i] == q["correct_answer"])
+    # Calculate score with one vectorized comparison, reused below for the
+    # per-question expanders and the downloadable results
+    correct = np.array([q["correct_answer"] for q in questions])
+    given = np.array(list(user_answers) + [""] * (len(questions) - len(user_answers)))
+    mask = correct == given
+    correct_count = int(mask.sum())
     total_questions = len(questions)
     score_percentage = (correct_count / total_questions) * 100
     
@@ -404,7 +680,7 @@ def display_quiz_results():
     for i, question in enumerate(questions):
         user_answer = user_answers[i] if i < len(user_answers) else "Not answered"
         correct_answer = question["correct_answer"]
-        is_correct = user_answer == correct_answer
+        is_correct = bool(mask[i])
         
         with st.expander(f"Question {i+1}: {'✅' if is_correct else '❌'}"):
             st.write(f"**Question:** {question['question']}")
@@ -441,7 +717,7 @@ def display_quiz_results():
         # Download results
         results_text = f"Quiz Results\n\nScore: {correct_count}/{total_questions} ({score_percentage:.1f}%)\n\n"
         for i, q in enumerate(questions):
-            results_text += f"Q{i+1}: {q['question']}\n"
+            results_text += f"Q{i+1}: {q['question']} ({'correct' if mask[i] else 'incorrect'})\n"
             results_text += f"Your answer: {user_answers[i] if i < len(user_answers) else 'Not answered'}\n"
             results_text += f"Correct: {q['correct_answer']}\n\n"
         
@@ -455,49 +731,66 @@ def display_quiz_results():
 def learning_dashboard_page():
     st.header("📊 Learning Dashboard")
     st.markdown("Track your learning progress and insights!")
-    
-    if not st.session_state.search_history:
+
+    # Aggregations run inside SQLite, so the dashboard stays cheap however
+    # large the persisted history grows; ttl keeps results for a minute
+    conn = get_history_connection()
+    totals = conn.query(
+        "SELECT COUNT(*) AS topics, COUNT(DISTINCT subject) AS subjects, "
+        "COUNT(DISTINCT date(timestamp)) AS days FROM history",
+        ttl=60,
+    ).iloc[0]
+
+    if not totals['topics']:
         st.info("🔍 Start exploring topics to see your learning analytics here!")
         return
-    
-    # Create dataframe from search history
-    df = pd.DataFrame(st.session_state.search_history)
-    df['date'] = pd.to_datetime(df['timestamp']).dt.date
-    
+
+    daily_counts = conn.query(
+        "SELECT date(timestamp) AS date, COUNT(*) AS count "
+        "FROM history GROUP BY date ORDER BY date",
+        ttl=60,
+    )
+    subject_counts = conn.query(
+        "SELECT subject, COUNT(*) AS count "
+        "FROM history GROUP BY subject ORDER BY count DESC",
+        ttl=60,
+    )
+
     # Metrics
     col1, col2, col3, col4 = st.columns(4)
-    
+
     with col1:
-        st.metric("📚 Topics Studied", len(df))
-    
+        st.metric("📚 Topics Studied", int(totals['topics']))
+
     with col2:
-        unique_subjects = df['subject'].nunique()
-        st.metric("🔬 Subjects Covered", unique_subjects)
-    
+        st.metric("🔬 Subjects Covered", int(totals['subjects']))
+
     with col3:
-        days_active = df['date'].nunique()
+        days_active = int(totals['days'])
         st.metric("📅 Days Active", days_active)
-    
+
     with col4:
-        avg_per_day = len(df) / max(days_active, 1)
+        avg_per_day = int(totals['topics']) / max(days_active, 1)
         st.metric("⚡ Avg Topics/Day", f"{avg_per_day:.1f}")
-    
+
     # Charts
     col1, col2 = st.columns(2)
-    
+
     with col1:
         st.subheader("📈 Study Activity")
-        daily_counts = df.groupby('date').size().reset_index(name='count')
         st.line_chart(daily_counts.set_index('date'))
-    
+
     with col2:
         st.subheader("🔬 Subject Distribution")
-        subject_counts = df['subject'].value_counts()
-        st.bar_chart(subject_counts)
-    
+        st.bar_chart(subject_counts.set_index('subject'))
+
     # Recent activity
     st.subheader("🕒 Recent Learning Activity")
-    recent_df = df.tail(5)[['topic', 'subject', 'timestamp']]
+    recent_df = conn.query(
+        "SELECT topic, subject, timestamp FROM history "
+        "ORDER BY rowid DESC LIMIT 5",
+        ttl=60,
+    )
     st.dataframe(recent_df, use_container_width=True)
 
 def study_history_page():
@@ -515,17 +808,24 @@ def study_history_page():
         search_term = st.text_input("🔍 Search topics:", placeholder="Search your studied topics...")
     
     with col2:
-        subject_filter = st.selectbox("Filter by subject:", 
-                                     ["All"] + list(set([h['subject'] for h in st.session_state.search_history])))
-    
-    # Filter history
-    filtered_history = st.session_state.search_history
-    
-    if search_term:
-        filtered_history = [h for h in filtered_history if search_term.lower() in h['topic'].lower()]
+        subject_filter = st.selectbox("Filter by subject:",
+                                     ["All"] + sorted({h['subject'] for h in st.session_state.search_history}))
     
+    # Filter history through the prebuilt index: subject filter is a hash
+    # lookup and the substring match runs on precomputed lowercase topics
+    history = list(st.session_state.search_history)
+    index = st.session_state.history_index
+
     if subject_filter != "All":
-        filtered_history = [h for h in filtered_history if h['subject'] == subject_filter]
+        candidates = index['by_subject'].get(subject_filter, [])
+    else:
+        candidates = range(len(history))
+
+    if search_term:
+        term = search_term.lower()
+        candidates = [i for i in candidates if term in index['lower_topics'][i]]
+
+    filtered_history = [history[i] for i in candidates]
     
     # Display history
     if filtered_history:
@@ -552,7 +852,14 @@ def study_history_page():
         st.divider()
         if st.button("🗑️ Clear All History", type="secondary"):
             if st.button("⚠️ Confirm Clear History"):
-                st.session_state.search_history = []
+                from sqlalchemy import text
+
+                conn = get_history_connection()
+                with conn.session as s:
+                    s.execute(text("DELETE FROM history"))
+                    s.commit()
+                st.session_state.search_history = deque(maxlen=10)
+                rebuild_history_index()
                 st.success("History cleared!")
                 st.rerun()
 